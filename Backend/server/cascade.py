@@ -0,0 +1,85 @@
+import logging
+from typing import Callable, List, Optional, TypeVar
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from llm import LLMRegistry
+from llm_gateway import LLMGateway, llm_gateway
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# What a tier's output may fail with to be handed to the next tier
+SCHEMA_ERRORS = (ValueError, KeyError, TypeError, ValidationError)
+
+
+class ModelCascade:
+    """Sends a prompt to a fast model first and escalates to the default model if needed.
+
+    Small inputs (at most `max_files` files and `max_tokens` prompt tokens) go to
+    `fast_model`, whose output must also pass a strict `validate`; on a schema
+    failure or an error the prompt is re-sent to `model`. Anything bigger goes
+    straight to `model`. Without a fast model configured this is a plain call.
+    """
+
+    def __init__(
+        self,
+        registry: LLMRegistry,
+        gateway: LLMGateway = llm_gateway,
+        fast_model: Optional[str] = settings.llm_fast_model,
+        model: str = settings.llm_model,
+        max_files: int = settings.llm_cascade_max_files,
+        max_tokens: int = settings.llm_cascade_max_tokens,
+    ):
+        self.registry = registry
+        self.gateway = gateway
+        self.fast_model = fast_model if fast_model and fast_model != model else None
+        self.model = model
+        self.max_files = max_files
+        self.max_tokens = max_tokens
+
+    @property
+    def label(self) -> str:
+        """Identifies the models answers can come from, for cache keys."""
+        return f"{self.fast_model}>{self.model}" if self.fast_model else self.model
+
+    def models_for(self, files: int, tokens: int) -> List[str]:
+        if self.fast_model and files <= self.max_files and tokens <= self.max_tokens:
+            return [self.fast_model, self.model]
+        return [self.model]
+
+    async def run(
+        self,
+        prompt: list,
+        parse: Callable[[str], T],
+        validate: Callable[[T], None],
+        files: int,
+        tokens: int,
+        on_model: Optional[Callable[[str], None]] = None,
+        on_first_token: Optional[Callable[[], None]] = None,
+    ) -> T:
+        """Return the parsed output of the first model in the cascade that gets it right.
+
+        Only the last model's output is accepted without `validate`.
+        """
+        models = self.models_for(files, tokens)
+        for i, model in enumerate(models):
+            final = i == len(models) - 1
+            if on_model:
+                on_model(model)
+            try:
+                text = await self.gateway.invoke(self.registry.get(model), prompt, on_first_token)
+                result = parse(text)
+                if not final:
+                    validate(result)
+                return result
+            except HTTPException:
+                raise
+            except Exception as e:
+                if final:
+                    raise
+                reason = "invalid output" if isinstance(e, SCHEMA_ERRORS) else "error"
+                logger.info(f"Escalating from {model} to {models[i + 1]} after {reason}: {str(e)}")
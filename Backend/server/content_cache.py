@@ -0,0 +1,146 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, NamedTuple, Optional
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def token_scope(token: str) -> str:
+    """Short digest identifying a token in cache keys without storing the token itself."""
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+class LRUCache:
+    """Thread-safe LRU mapping bounded by the total size of its values."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, tuple[Any, int]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: str, value: Any, size: int) -> None:
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous[1]
+            self._entries[key] = (value, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+
+class BlobCache:
+    """Content-addressed cache of decoded file contents, keyed by git blob SHA.
+
+    Blob SHAs are derived from file contents, so entries never go stale and can be
+    shared across repositories, branches and commits. The in-memory tier is an LRU
+    bounded by total bytes; the optional on-disk tier survives restarts.
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: Optional[str] = None):
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self._memory = LRUCache(max_bytes)
+
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    def get(self, sha: str) -> Optional[str]:
+        content = self._memory.get(sha)
+        if content is not None:
+            return content
+
+        content = self._read_disk(sha)
+        if content is not None:
+            self._memory.put(sha, content, len(content))
+        return content
+
+    def put(self, sha: str, content: str) -> None:
+        self._memory.put(sha, content, len(content))
+        self._write_disk(sha, content)
+
+    def _disk_path(self, sha: str) -> Path:
+        return self.disk_dir / sha[:2] / sha
+
+    def _read_disk(self, sha: str) -> Optional[str]:
+        if not self.disk_dir:
+            return None
+        try:
+            return self._disk_path(sha).read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        except (OSError, UnicodeDecodeError) as e:
+            logger.warning(f"Blob cache read failed for {sha}: {str(e)}")
+            return None
+
+    def _write_disk(self, sha: str, content: str) -> None:
+        if not self.disk_dir:
+            return
+        path = self._disk_path(sha)
+        if path.exists():
+            return
+        try:
+            path.parent.mkdir(exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_text(content, encoding="utf-8")
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Blob cache write failed for {sha}: {str(e)}")
+
+
+class CachedResponse(NamedTuple):
+    etag: str
+    content_type: Optional[str]
+    body: bytes
+
+
+class ETagStore:
+    """Remembers ETags and bodies of GitHub GET responses for conditional requests.
+
+    Keys combine the request URL with a digest of the token, so one user's
+    cached body is never replayed for another user's request.
+    """
+
+    def __init__(self, max_bytes: int):
+        self._memory = LRUCache(max_bytes)
+
+    @staticmethod
+    def key(token: str, url: str) -> str:
+        return f"{token_scope(token)}:{url}"
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        return self._memory.get(key)
+
+    def put(self, key: str, response: CachedResponse) -> None:
+        self._memory.put(key, response, len(response.body))
+
+
+blob_cache = BlobCache(
+    max_bytes=settings.blob_cache_max_bytes,
+    disk_dir=settings.blob_cache_dir,
+)
+
+etag_store = ETagStore(max_bytes=settings.etag_cache_max_bytes)
+
+# Final /analyze results, keyed by commit SHA and everything else that shapes the output
+analysis_cache = LRUCache(max_bytes=settings.analysis_cache_max_bytes)
+
+# /generate-pipeline results, keyed by a hash of the canonicalized request
+pipeline_cache = LRUCache(max_bytes=settings.pipeline_cache_max_bytes)
@@ -0,0 +1,622 @@
+import asyncio
+import base64
+import logging
+import tarfile
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Mapping, Optional, Set
+
+import anyio
+import httpx
+import ijson
+
+from content_cache import BlobCache, CachedResponse, ETagStore, blob_cache, etag_store
+from rate_limit import RateLimiter, rate_limiter, resource_for
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+BLOB_QUERY_FIELDS = "... on Blob { text isBinary isTruncated }"
+
+# Asks the Contents and Blobs APIs for the file bytes instead of base64 in JSON
+RAW_MEDIA_TYPE = "application/vnd.github.raw"
+
+# Called as on_file(path, content, cached) for every file fetch_files returns
+FileCallback = Callable[[str, str, bool], None]
+# Called as on_skip(paths) with files fetch_files left out, either to save rate-limit
+# budget or because they failed in a way that may not happen next time
+SkipCallback = Callable[[List[str]], None]
+
+
+class TransientFetchError(Exception):
+    """A file couldn't be fetched because of a network error or a GitHub server error."""
+
+
+class GitHubResponseError(Exception):
+    """Raised when a streamed GitHub request comes back with a non-200 status."""
+
+    def __init__(self, response: httpx.Response):
+        super().__init__(f"GitHub API returned {response.status_code}")
+        self.response = response
+
+
+@dataclass
+class TreeListing:
+    """The relevant blobs of a git tree, collected while the tree was being parsed."""
+    blob_shas: Dict[str, str] = field(default_factory=dict)
+    buckets: Dict[str, str] = field(default_factory=dict)
+    blob_count: int = 0
+    truncated: bool = False
+    # Set when subtrees had to be skipped, so the listing may be missing files
+    incomplete: bool = False
+
+    def add_blob(self, path: str, sha: str, classify: Callable[[str], Optional[str]]) -> None:
+        self.blob_count += 1
+        bucket = classify(path)
+        if bucket:
+            self.blob_shas[path] = sha
+            self.buckets[path] = bucket
+
+
+class _AsyncChunkReader:
+    """Async file-like view over a byte iterator, as expected by ijson's async API."""
+
+    def __init__(self, chunks: AsyncIterator[bytes]):
+        self._chunks = chunks
+        self._buffer = b""
+
+    async def read(self, size: int = -1) -> bytes:
+        # ijson probes with read(0), and an empty result otherwise means EOF
+        if size == 0:
+            return b""
+        if not self._buffer:
+            async for chunk in self._chunks:
+                if chunk:
+                    self._buffer = chunk
+                    break
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+class _AsyncStreamReader:
+    """Blocking file-like view over an async byte iterator.
+
+    Meant to be read from a worker thread: each refill hops back to the event
+    loop for the next chunk, so only one chunk is ever buffered.
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes]):
+        self._chunks = chunks
+        self._buffer = b""
+        self._eof = False
+
+    async def _next_chunk(self) -> Optional[bytes]:
+        try:
+            return await self._chunks.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            chunk = anyio.from_thread.run(self._next_chunk)
+            if chunk is None:
+                self._eof = True
+            else:
+                self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def _too_large(resp: httpx.Response) -> bool:
+    """Whether the Contents API refused or emptied a file because of its size."""
+    if resp.status_code == 403:
+        try:
+            data = resp.json()
+        except ValueError:
+            return False
+        if not isinstance(data, dict):
+            return False
+        return any(error.get("code") == "too_large" for error in data.get("errors") or [])
+    if resp.status_code == 200 and resp.headers.get("Content-Type", "").startswith("application/json"):
+        try:
+            data = resp.json()
+        except ValueError:
+            return False
+        return isinstance(data, dict) and data.get("encoding") == "none"
+    return False
+
+
+def _decode_content(resp: httpx.Response) -> Optional[str]:
+    """Text of a file response: raw bytes, or base64 in JSON if the raw media type was ignored."""
+    try:
+        if resp.headers.get("Content-Type", "").startswith("application/json"):
+            data = resp.json()
+            if not isinstance(data, dict) or data.get("type", "file") != "file":
+                return None
+            return base64.b64decode(data["content"]).decode("utf-8")
+        return resp.content.decode("utf-8")
+    except (KeyError, ValueError, UnicodeDecodeError):
+        return None
+
+
+def _extract_members(fileobj: _AsyncStreamReader, wanted: Set[str]) -> Dict[str, str]:
+    """Stream through a gzipped tarball, decoding only the wanted members."""
+    results = {}
+    with tarfile.open(fileobj=fileobj, mode="r|gz") as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            # Archive members are prefixed with a "{owner}-{repo}-{sha}/" directory
+            _, _, path = member.name.partition("/")
+            if path not in wanted:
+                continue
+            try:
+                results[path] = archive.extractfile(member).read().decode("utf-8")
+            except UnicodeDecodeError:
+                continue
+            if len(results) == len(wanted):
+                break
+    return results
+
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Build the process-wide, connection-pooled HTTP client for GitHub.
+
+    Created once at app startup and closed at shutdown so keep-alive connections
+    (and HTTP/2 multiplexing when `h2` is installed) are reused across requests.
+    """
+    return httpx.AsyncClient(
+        headers={
+            "Accept": "application/vnd.github+json",
+            "X-GitHub-Api-Version": "2022-11-28",
+            "User-Agent": "RepoAnalyzer/1.0"
+        },
+        timeout=settings.github_timeout,
+        limits=httpx.Limits(
+            max_connections=settings.github_max_connections,
+            max_keepalive_connections=settings.github_max_keepalive_connections,
+        ),
+        http2=HTTP2_AVAILABLE,
+    )
+
+
+async def _gather_or_cancel(coros: List[Awaitable[None]]) -> None:
+    """Run `coros` concurrently; the first to fail cancels the rest and its error is raised."""
+    tasks = [asyncio.create_task(coro) for coro in coros]
+    if not tasks:
+        return
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class GitHubClient:
+    """Async GitHub client for fetching repository trees and file contents.
+
+    Wraps the shared pooled HTTP client with one user's token.
+
+    Three fetch modes are supported:
+    - "contents": one Contents API request per path (resolves ref + path server side).
+    - "blobs": one Git Data API request per blob SHA from the tree.
+    - "graphql": many blobs per GraphQL query, looked up by SHA; truncated or
+      failed blobs fall back to the Git Data API.
+
+    Whatever the mode, once `archive_threshold` or more files need fetching the
+    repository tarball is streamed instead and only the wanted members are kept.
+    """
+
+    def __init__(
+        self,
+        http: httpx.AsyncClient,
+        token: str,
+        api_base: str = settings.github_api_base,
+        concurrency: int = settings.github_fetch_concurrency,
+        fetch_mode: str = settings.github_fetch_mode,
+        graphql_batch_size: int = settings.github_graphql_batch_size,
+        archive_threshold: int = settings.github_archive_threshold,
+        cache: Optional[BlobCache] = blob_cache,
+        etags: Optional[ETagStore] = etag_store,
+        limiter: Optional[RateLimiter] = rate_limiter,
+    ):
+        self.http = http
+        self.api_base = api_base
+        # The pooled client is shared across users, so auth is attached per call
+        self.token = token
+        self.headers = {"Authorization": f"token {token}"}
+        self.concurrency = concurrency
+        self.fetch_mode = fetch_mode
+        self.graphql_batch_size = graphql_batch_size
+        self.archive_threshold = archive_threshold
+        self.cache = cache
+        self.etags = etags
+        self.limiter = limiter
+
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request within the token's rate-limit budget, retrying rate-limited ones."""
+        attempt = 0
+        while True:
+            if self.limiter:
+                await self.limiter.acquire(self.token, resource_for(url))
+            resp = await self.http.request(method, url, **kwargs)
+            delay = self.limiter.record(self.token, resp, attempt) if self.limiter else None
+            if delay is None:
+                return resp
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def _stream(self, method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """Streaming counterpart of `_request`; error bodies are read before they're returned."""
+        attempt = 0
+        while True:
+            if self.limiter:
+                await self.limiter.acquire(self.token, resource_for(url))
+            async with self.http.stream(method, url, **kwargs) as resp:
+                if resp.status_code >= 400:
+                    await resp.aread()
+                delay = self.limiter.record(self.token, resp, attempt) if self.limiter else None
+                if delay is None:
+                    yield resp
+                    return
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def get(
+        self, url: str, params: Optional[Dict[str, str]] = None, accept: Optional[str] = None
+    ) -> httpx.Response:
+        """GET with If-None-Match revalidation.
+
+        A 304 is turned back into a 200 carrying the cached body, so callers never
+        see the difference; GitHub doesn't count 304s against the rate limit.
+        """
+        headers = dict(self.headers)
+        if accept:
+            headers["Accept"] = accept
+
+        key = None
+        if self.etags:
+            key = self.etags.key(self.token, f"{httpx.URL(url, params=params)} {accept or ''}")
+        cached = self.etags.get(key) if key else None
+        if cached:
+            headers["If-None-Match"] = cached.etag
+        resp = await self._request("GET", url, params=params, headers=headers)
+
+        if resp.status_code == 304 and cached:
+            return httpx.Response(
+                200,
+                headers={"ETag": cached.etag, "Content-Type": cached.content_type or ""},
+                content=cached.body,
+                request=resp.request,
+            )
+        if resp.status_code == 200 and key and resp.headers.get("ETag"):
+            self.etags.put(key, CachedResponse(
+                etag=resp.headers["ETag"],
+                content_type=resp.headers.get("Content-Type"),
+                body=resp.content,
+            ))
+        return resp
+
+    async def resolve_commit(self, owner: str, repo: str, ref: str) -> httpx.Response:
+        """Resolve a branch, tag or SHA to a commit SHA (returned as the plain-text body)."""
+        commit_url = f"{self.api_base}/repos/{owner}/{repo}/commits/{ref}"
+        return await self.get(commit_url, accept="application/vnd.github.sha")
+
+    async def fetch_tree(
+        self, owner: str, repo: str, ref: str, classify: Callable[[str], Optional[str]]
+    ) -> TreeListing:
+        """Stream the recursive git tree for `ref`, keeping only blobs `classify` buckets.
+
+        The response is parsed incrementally, so memory stays flat no matter how
+        many entries the tree has. Raises GitHubResponseError on a non-200 status.
+        """
+        tree_url = f"{self.api_base}/repos/{owner}/{repo}/git/trees/{ref}"
+        listing = TreeListing()
+        async with self._stream(
+            "GET", tree_url, params={"recursive": "1"}, headers=self.headers
+        ) as resp:
+            if resp.status_code != 200:
+                raise GitHubResponseError(resp)
+
+            path = kind = sha = None
+            async for prefix, event, value in ijson.parse_async(_AsyncChunkReader(resp.aiter_bytes())):
+                if prefix == "tree.item.path":
+                    path = value
+                elif prefix == "tree.item.type":
+                    kind = value
+                elif prefix == "tree.item.sha":
+                    sha = value
+                elif prefix == "tree.item" and event == "end_map":
+                    if kind == "blob":
+                        listing.add_blob(path, sha, classify)
+                    path = kind = sha = None
+                elif prefix == "truncated" and event == "boolean":
+                    listing.truncated = value
+        return listing
+
+    async def walk_tree(
+        self, owner: str, repo: str, ref: str,
+        classify: Callable[[str], Optional[str]], prune: Callable[[str], bool]
+    ) -> TreeListing:
+        """List a tree one directory at a time, for trees too big for `recursive=1`.
+
+        Subtrees are fetched in parallel (at most `concurrency` at once), and
+        directories for which `prune(name)` is true are never descended into.
+        Raises GitHubResponseError if the root can't be listed; subtrees that
+        fail to load are logged and skipped, and the listing marked incomplete.
+        Anything else, like running out of rate limit, aborts the walk and
+        cancels the subtrees still in flight.
+        """
+        listing = TreeListing()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def walk(tree_sha: str, prefix: str) -> None:
+            tree_url = f"{self.api_base}/repos/{owner}/{repo}/git/trees/{tree_sha}"
+            try:
+                async with semaphore:
+                    resp = await self.get(tree_url)
+            except httpx.HTTPError as e:
+                if not prefix:
+                    raise
+                logger.warning(f"Subtree {prefix} of {owner}/{repo} failed: {str(e)}")
+                listing.incomplete = True
+                return
+            if resp.status_code != 200:
+                if not prefix:
+                    raise GitHubResponseError(resp)
+                logger.warning(f"Subtree {prefix} of {owner}/{repo} returned {resp.status_code}")
+                listing.incomplete = True
+                return
+
+            subtrees = []
+            for item in resp.json().get("tree", []):
+                path = prefix + item["path"]
+                if item["type"] == "blob":
+                    listing.add_blob(path, item["sha"], classify)
+                elif item["type"] == "tree" and not prune(item["path"]):
+                    subtrees.append(walk(item["sha"], path + "/"))
+            await _gather_or_cancel(subtrees)
+
+        await walk(ref, "")
+        return listing
+
+    async def fetch_file(
+        self, owner: str, repo: str, path: str, ref: str, sha: Optional[str] = None
+    ) -> Optional[str]:
+        """Fetch a single file through the Contents API. Returns None if it can't be read.
+
+        Files the Contents API won't serve because of their size are fetched as a
+        blob instead when their `sha` is known. Raises TransientFetchError on a
+        network or server error.
+        """
+        content_url = f"{self.api_base}/repos/{owner}/{repo}/contents/{path}"
+        try:
+            resp = await self.get(content_url, params={"ref": ref}, accept=RAW_MEDIA_TYPE)
+        except httpx.HTTPError as e:
+            raise TransientFetchError(f"Content fetch failed for {owner}/{repo}:{path}: {str(e)}")
+
+        if sha and _too_large(resp):
+            logger.info(f"{owner}/{repo}:{path} is too large for the Contents API, fetching its blob")
+            return await self.fetch_blob(owner, repo, sha)
+        if resp.status_code >= 500:
+            raise TransientFetchError(
+                f"Content fetch returned {resp.status_code} for {owner}/{repo}:{path}"
+            )
+        if resp.status_code != 200:
+            logger.warning(f"Content fetch returned {resp.status_code} for {owner}/{repo}:{path}")
+            return None
+        return _decode_content(resp)
+
+    async def fetch_blob(
+        self, owner: str, repo: str, sha: str
+    ) -> Optional[str]:
+        """Fetch a single blob through the Git Data API. Returns None if it can't be read.
+
+        Raises TransientFetchError on a network or server error.
+        """
+        blob_url = f"{self.api_base}/repos/{owner}/{repo}/git/blobs/{sha}"
+        try:
+            resp = await self.get(blob_url, accept=RAW_MEDIA_TYPE)
+        except httpx.HTTPError as e:
+            raise TransientFetchError(f"Blob fetch failed for {owner}/{repo}@{sha}: {str(e)}")
+        if resp.status_code >= 500:
+            raise TransientFetchError(f"Blob fetch returned {resp.status_code} for {owner}/{repo}@{sha}")
+        if resp.status_code != 200:
+            logger.warning(f"Blob fetch returned {resp.status_code} for {owner}/{repo}@{sha}")
+            return None
+        return _decode_content(resp)
+
+    async def fetch_blobs_graphql(
+        self, owner: str, repo: str, shas: List[str]
+    ) -> Dict[str, Optional[str]]:
+        """Fetch a batch of blobs in a single GraphQL query.
+
+        Returns a mapping for every requested SHA: the text, or None when GraphQL
+        couldn't return it in full (truncated, missing, or the query failed).
+        """
+        aliases = "\n".join(
+            f'f{i}: object(oid: "{sha}") {{ {BLOB_QUERY_FIELDS} }}' for i, sha in enumerate(shas)
+        )
+        query = (
+            "query($owner: String!, $name: String!) {\n"
+            f"  repository(owner: $owner, name: $name) {{\n{aliases}\n  }}\n"
+            "}"
+        )
+        results: Dict[str, Optional[str]] = dict.fromkeys(shas)
+        try:
+            resp = await self._request(
+                "POST",
+                f"{self.api_base}/graphql",
+                json={"query": query, "variables": {"owner": owner, "name": repo}},
+                headers=self.headers,
+            )
+        except httpx.HTTPError as e:
+            logger.warning(f"GraphQL blob fetch failed for {owner}/{repo}: {str(e)}")
+            return results
+        if resp.status_code != 200:
+            logger.warning(f"GraphQL blob fetch returned {resp.status_code} for {owner}/{repo}")
+            return results
+
+        repository = (resp.json().get("data") or {}).get("repository") or {}
+        for i, sha in enumerate(shas):
+            blob = repository.get(f"f{i}")
+            if blob and not blob.get("isBinary") and not blob.get("isTruncated"):
+                results[sha] = blob.get("text")
+        return results
+
+    async def fetch_archive(
+        self, owner: str, repo: str, paths: Set[str], ref: str
+    ) -> Optional[Dict[str, str]]:
+        """Stream the repository tarball, keeping only `paths`. Returns None on failure."""
+        archive_url = f"{self.api_base}/repos/{owner}/{repo}/tarball/{ref}"
+        try:
+            async with self._stream(
+                "GET", archive_url, headers=self.headers, follow_redirects=True
+            ) as resp:
+                if resp.status_code != 200:
+                    logger.warning(f"Archive fetch returned {resp.status_code} for {owner}/{repo}")
+                    return None
+                reader = _AsyncStreamReader(resp.aiter_bytes())
+                return await anyio.to_thread.run_sync(_extract_members, reader, paths)
+        except (httpx.HTTPError, tarfile.TarError, EOFError, OSError) as e:
+            logger.warning(f"Archive fetch failed for {owner}/{repo}: {str(e)}")
+            return None
+
+    async def fetch_files(
+        self, owner: str, repo: str, files: Mapping[str, str], ref: str,
+        on_file: Optional[FileCallback] = None,
+        priority: Optional[Callable[[str], Any]] = None,
+        on_skip: Optional[SkipCallback] = None,
+    ) -> Dict[str, str]:
+        """Fetch many files concurrently, at most `concurrency` requests in flight at once.
+
+        `files` maps each path to its blob SHA from the tree; blobs already in the
+        cache are served without touching the network. `on_file` is told about
+        each file as soon as its content is available. Files are requested in
+        `priority` order (a sort key, lowest first), and when the token's rate-limit
+        budget can't cover them all, the least valuable are skipped and passed to
+        `on_skip`, as are files that failed on a network or server error. With no
+        budget left at all, the limiter waits for the reset or raises
+        RateLimitExceeded.
+        """
+        results = {}
+        missing = {}
+        for path, sha in files.items():
+            cached = self.cache.get(sha) if self.cache and sha else None
+            if cached is not None:
+                results[path] = cached
+                if on_file:
+                    on_file(path, cached, True)
+            else:
+                missing[path] = sha
+
+        if missing:
+            results.update(await self._fetch_missing(
+                owner, repo, missing, ref, on_file, priority, on_skip
+            ))
+
+        # Preserve the caller's ordering so snapshots stay deterministic
+        return {path: results[path] for path in files if path in results}
+
+    async def _fetch_missing(
+        self, owner: str, repo: str, missing: Mapping[str, str], ref: str,
+        on_file: Optional[FileCallback], priority: Optional[Callable[[str], Any]],
+        on_skip: Optional[SkipCallback],
+    ) -> Dict[str, str]:
+        fetched = None
+        if self.archive_threshold and len(missing) >= self.archive_threshold:
+            fetched = await self.fetch_archive(owner, repo, set(missing), ref)
+            if fetched is not None and on_file:
+                for path, content in fetched.items():
+                    on_file(path, content, False)
+        if fetched is None:
+            fetched = await self._fetch_individually(
+                owner, repo, missing, ref, on_file, priority, on_skip
+            )
+
+        for path, content in fetched.items():
+            if self.cache and missing[path]:
+                self.cache.put(missing[path], content)
+        return fetched
+
+    async def _fetch_individually(
+        self, owner: str, repo: str, missing: Mapping[str, str], ref: str,
+        on_file: Optional[FileCallback], priority: Optional[Callable[[str], Any]],
+        on_skip: Optional[SkipCallback],
+    ) -> Dict[str, str]:
+        # The semaphore wakes waiters in order, so the most valuable files go first
+        semaphore = asyncio.Semaphore(self.concurrency)
+        paths = sorted(missing, key=priority) if priority else list(missing)
+
+        by_sha: Dict[str, Optional[str]] = {}
+        if self.fetch_mode == "graphql":
+            shas = list(dict.fromkeys(missing[path] for path in paths if missing[path]))
+            batches = [
+                shas[i:i + self.graphql_batch_size]
+                for i in range(0, len(shas), self.graphql_batch_size)
+            ]
+
+            async def bounded_batch(batch: List[str]) -> Dict[str, Optional[str]]:
+                async with semaphore:
+                    return await self.fetch_blobs_graphql(owner, repo, batch)
+
+            for batch_result in await asyncio.gather(*(bounded_batch(b) for b in batches)):
+                by_sha.update(batch_result)
+
+        async def fetch_one(path: str) -> Optional[str]:
+            sha = missing[path]
+            if by_sha.get(sha) is not None:
+                return by_sha[sha]
+            async with semaphore:
+                if sha and self.fetch_mode in ("blobs", "graphql"):
+                    return await self.fetch_blob(owner, repo, sha)
+                return await self.fetch_file(owner, repo, path, ref, sha)
+
+        failed: List[str] = []
+
+        async def bounded_fetch(path: str) -> Optional[str]:
+            try:
+                content = await fetch_one(path)
+            except TransientFetchError as e:
+                logger.warning(str(e))
+                failed.append(path)
+                return None
+            if content is not None and on_file:
+                on_file(path, content, False)
+            return content
+
+        # Fetch only what the limiter will let through. With nothing allowed, the
+        # limiter waits for the reset or gives up; skipping every file would
+        # only produce an empty analysis.
+        budget = self.limiter.available(self.token) if self.limiter else None
+        if budget:
+            needed = [path for path in paths if by_sha.get(missing[path]) is None]
+            if len(needed) > budget:
+                logger.warning(
+                    f"Rate-limit budget covers {budget} of {len(needed)} files for "
+                    f"{owner}/{repo}, skipping the least valuable"
+                )
+                if on_skip:
+                    on_skip(needed[budget:])
+                skipped = set(needed[budget:])
+                paths = [path for path in paths if path not in skipped]
+
+        contents = await asyncio.gather(*(bounded_fetch(path) for path in paths))
+        if failed and on_skip:
+            on_skip(failed)
+        return {path: content for path, content in zip(paths, contents) if content is not None}
@@ -0,0 +1,211 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# Runs one job: runner(payload, progress) -> result
+JobRunner = Callable[[Dict[str, Any], Callable[[str, dict], None]], Awaitable[Any]]
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+# Payload fields kept in memory only, never written to the job database
+SECRET_FIELDS = ("github_pat",)
+
+INTERRUPTED_DETAIL = "Job interrupted by a server restart, please resubmit"
+
+# Each queue marks itself alive this often; a process silent for HEARTBEAT_GRACE
+# is gone, and its unfinished jobs are failed by whichever process notices first
+HEARTBEAT_INTERVAL = 10.0
+HEARTBEAT_GRACE = 3 * HEARTBEAT_INTERVAL
+
+
+class JobQueue:
+    """Durable queue of analysis jobs, drained by a fixed pool of asyncio workers.
+
+    Job state and results live in SQLite, so finished jobs stay pollable across
+    restarts and from every worker process sharing the file. Secret payload
+    fields (the GitHub token) are only held in memory, so a job can only run in
+    the process that accepted it: each row records its owner, and jobs whose
+    owner stops or stops heartbeating are marked failed.
+    """
+
+    def __init__(self, path: str, runner: JobRunner, workers: int, max_pending: int, ttl: float):
+        self.runner = runner
+        self.workers = workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._payloads: Dict[str, Dict[str, Any]] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._lock = threading.Lock()
+        # Identifies this process's queue on the rows it owns
+        self.owner = uuid.uuid4().hex
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, status TEXT NOT NULL, stage TEXT, request TEXT NOT NULL,"
+            " result TEXT, status_code INTEGER, detail TEXT,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL, owner TEXT)"
+        )
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(jobs)")]
+        if "owner" not in columns:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS job_owners (owner TEXT PRIMARY KEY, seen_at REAL NOT NULL)"
+        )
+
+    def start(self) -> None:
+        self._heartbeat()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._keep_alive()))
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        # Jobs still queued here can't be picked up by another process
+        self._execute(
+            "UPDATE jobs SET status = ?, status_code = 503, detail = ?, updated_at = ?"
+            " WHERE owner = ? AND status IN (?, ?)",
+            (FAILED, INTERRUPTED_DETAIL, time.time(), self.owner, QUEUED, RUNNING),
+        )
+        self._execute("DELETE FROM job_owners WHERE owner = ?", (self.owner,))
+        self._db.close()
+
+    def _heartbeat(self) -> None:
+        """Mark this queue alive and fail the unfinished jobs of queues that aren't."""
+        now = time.time()
+        self._execute(
+            "INSERT OR REPLACE INTO job_owners (owner, seen_at) VALUES (?, ?)", (self.owner, now)
+        )
+        self._execute("DELETE FROM job_owners WHERE seen_at < ?", (now - HEARTBEAT_GRACE,))
+        interrupted = self._execute(
+            "UPDATE jobs SET status = ?, status_code = 503, detail = ?, updated_at = ?"
+            " WHERE status IN (?, ?)"
+            " AND (owner IS NULL OR owner NOT IN (SELECT owner FROM job_owners))",
+            (FAILED, INTERRUPTED_DETAIL, now, QUEUED, RUNNING),
+        ).rowcount
+        if interrupted:
+            logger.warning(f"Marked {interrupted} interrupted analysis jobs as failed")
+
+    async def _keep_alive(self) -> None:
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            try:
+                self._heartbeat()
+            except sqlite3.Error as e:
+                logger.error(f"Analysis job heartbeat failed: {str(e)}")
+
+    def submit(self, payload: Dict[str, Any]) -> str:
+        """Queue a job and return its id. Raises HTTPException(503) when the queue is full."""
+        if self._queue.qsize() >= self.max_pending:
+            raise HTTPException(status_code=503, detail="Too many analysis jobs queued, try again later")
+
+        now = time.time()
+        self._execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+            (SUCCEEDED, FAILED, now - self.ttl),
+        )
+
+        job_id = uuid.uuid4().hex
+        stored = {key: value for key, value in payload.items() if key not in SECRET_FIELDS}
+        self._execute(
+            "INSERT INTO jobs (id, status, request, created_at, updated_at, owner)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, QUEUED, json.dumps(stored), now, now, self.owner),
+        )
+        self._payloads[job_id] = payload
+        self._queue.put_nowait(job_id)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status of a job, its result once it succeeded or its error once it failed."""
+        row = self._execute(
+            "SELECT status, stage, result, status_code, detail, created_at, updated_at, owner"
+            " FROM jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+
+        status, stage, result, status_code, detail, created_at, updated_at, owner = row
+        job = {
+            "job_id": job_id, "status": status, "created_at": created_at, "updated_at": updated_at,
+        }
+        if status == QUEUED:
+            # Only the owning process's queue is ahead of it
+            job["position"] = self._execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND owner = ? AND created_at < ?",
+                (QUEUED, owner, created_at),
+            ).fetchone()[0]
+        elif status == RUNNING:
+            job["stage"] = stage
+        elif status == SUCCEEDED:
+            job["result"] = json.loads(result)
+        else:
+            job["error"] = {"status_code": status_code, "detail": detail}
+        return job
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._db.execute(sql, params)
+
+    def _set(self, job_id: str, **fields: Any) -> None:
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        self._execute(
+            f"UPDATE jobs SET {columns}, updated_at = ? WHERE id = ?",
+            (*fields.values(), time.time(), job_id),
+        )
+
+    async def _work(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            payload = self._payloads.pop(job_id, None)
+            try:
+                if payload is not None:
+                    await self._run(job_id, payload)
+            except sqlite3.Error as e:
+                # Other processes write the same file; a locked database must not kill the worker
+                logger.error(f"Could not record the outcome of analysis job {job_id}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str, payload: Dict[str, Any]) -> None:
+        try:
+            self._set(job_id, status=RUNNING, stage=None)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not mark analysis job {job_id} running: {str(e)}")
+
+        def progress(event: str, data: dict) -> None:
+            # Per-file events would mean a database write per file; stages are enough.
+            # The analysis may be shared with other callers, so a failed write stops here.
+            if event != "file":
+                try:
+                    self._set(job_id, stage=event)
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not record stage of analysis job {job_id}: {str(e)}")
+
+        try:
+            result = await self.runner(payload, progress)
+        except HTTPException as e:
+            self._set(job_id, status=FAILED, status_code=e.status_code, detail=e.detail)
+        except asyncio.CancelledError:
+            self._set(job_id, status=FAILED, status_code=503, detail=INTERRUPTED_DETAIL)
+            raise
+        except Exception as e:
+            logger.error(f"Analysis job {job_id} failed: {str(e)}")
+            self._set(job_id, status=FAILED, status_code=500, detail="Failed to analyze repository")
+        else:
+            self._set(job_id, status=SUCCEEDED, result=json.dumps(result))
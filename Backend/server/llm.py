@@ -0,0 +1,48 @@
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LLMRegistry:
+    """Process-wide cache of chat model clients, keyed by (model, temperature).
+
+    Building a ChatGoogleGenerativeAI sets up credentials and transport channels,
+    so clients are created once (at startup for the default model) and shared by
+    every request.
+    """
+
+    def __init__(self, api_key: Optional[str] = settings.google_api_key):
+        self.api_key = api_key
+        self._clients: Dict[Tuple[str, float], ChatGoogleGenerativeAI] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self, model: str = settings.llm_model, temperature: float = settings.llm_temperature
+    ) -> ChatGoogleGenerativeAI:
+        key = (model, temperature)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                logger.info(f"Creating LLM client for {model} (temperature={temperature})")
+                kwargs = {"api_key": self.api_key} if self.api_key else {}
+                # Retries and backoff are handled by the LLM gateway, which needs to
+                # see quota errors to adapt its concurrency limit
+                client = ChatGoogleGenerativeAI(
+                    model=model, temperature=temperature, max_retries=1, **kwargs
+                )
+                self._clients[key] = client
+        return client
+
+    def close(self) -> None:
+        with self._lock:
+            self._clients.clear()
@@ -0,0 +1,198 @@
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Optional, Tuple
+
+import anyio
+import xxhash
+
+from content_cache import LRUCache
+from settings import settings
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+_TRAILING_WHITESPACE = re.compile(r"[ \t]+$", re.MULTILINE)
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def normalize_snapshot(snapshot: str) -> str:
+    """Canonical form of a snapshot: LF line endings, no trailing whitespace or blank-line runs."""
+    text = snapshot.replace("\r\n", "\n").replace("\r", "\n")
+    text = _TRAILING_WHITESPACE.sub("", text)
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+
+class MemoryBackend:
+    """In-process backend: an LRU bounded by total value size."""
+
+    # Cheap enough to call on the event loop
+    blocking = False
+
+    def __init__(self, max_bytes: int):
+        self._memory = LRUCache(max_bytes)
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        return self._memory.get(key)
+
+    def set(self, key: str, value: str, expires_at: float) -> None:
+        self._memory.put(key, (value, expires_at), len(value))
+
+
+class SQLiteBackend:
+    """SQLite file backend, shared by every worker on the host and kept across restarts.
+
+    Rows past their expiry are dropped on write, then the least recently read
+    rows go until the table fits in `max_bytes`.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)")
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                self._db.execute(
+                    "UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (time.time(), key)
+                )
+        return row
+
+    def set(self, key: str, value: str, expires_at: float) -> None:
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?)",
+                    (key, value, size, expires_at, now),
+                )
+                total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+                if total > self.max_bytes:
+                    rows = self._db.execute(
+                        "SELECT key, size FROM llm_cache WHERE key != ? ORDER BY accessed_at", (key,)
+                    ).fetchall()
+                    evicted = []
+                    for old_key, old_size in rows:
+                        if total <= self.max_bytes:
+                            break
+                        evicted.append((old_key,))
+                        total -= old_size
+                    self._db.executemany("DELETE FROM llm_cache WHERE key = ?", evicted)
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                self._db.execute("ROLLBACK")
+                raise
+
+
+class RedisBackend:
+    """Redis (or any server speaking its protocol) backend.
+
+    Expiry is left to Redis, and the size bound to the server's maxmemory policy.
+    Every call gives up after `timeout` seconds, so a stuck server reads as a miss.
+    """
+
+    blocking = True
+
+    def __init__(self, url: str, timeout: float):
+        if redis is None:
+            raise RuntimeError("The redis package is required for the redis LLM cache backend")
+        self._client = redis.Redis.from_url(
+            url, socket_timeout=timeout, socket_connect_timeout=timeout
+        )
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        value = self._client.get(key)
+        if value is None:
+            return None
+        # Redis already dropped it if it had expired
+        return value.decode("utf-8"), float("inf")
+
+    def set(self, key: str, value: str, expires_at: float) -> None:
+        ttl = int(expires_at - time.time())
+        if ttl > 0:
+            self._client.set(key, value, ex=ttl)
+
+
+class LLMResponseCache:
+    """Parsed LLM responses keyed by a hash of the normalized prompt input.
+
+    The key covers the snapshot, the prompt version and the model, and nothing
+    about which repository the snapshot came from, so forks and repositories
+    built from the same template share an entry. Backend errors are logged and
+    treated as misses, so the cache can never fail a request. Backends that do
+    I/O are called from a worker thread, off the event loop.
+    """
+
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+
+    @staticmethod
+    def key(snapshot: str, prompt_version: str, model: str) -> str:
+        digest = xxhash.xxh3_128_hexdigest(normalize_snapshot(snapshot).encode("utf-8"))
+        return f"llm:{prompt_version}:{model}:{digest}"
+
+    async def _call(self, method: Callable[..., Any], *args: Any) -> Any:
+        if self.backend.blocking:
+            return await anyio.to_thread.run_sync(method, *args)
+        return method(*args)
+
+    async def get(self, key: str) -> Optional[Any]:
+        try:
+            entry = await self._call(self.backend.get, key)
+        except Exception as e:
+            logger.warning(f"LLM cache read failed: {str(e)}")
+            return None
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.time():
+            return None
+        return json.loads(value)
+
+    async def put(self, key: str, value: Any) -> None:
+        try:
+            await self._call(self.backend.set, key, json.dumps(value), time.time() + self.ttl)
+        except Exception as e:
+            logger.warning(f"LLM cache write failed: {str(e)}")
+
+
+def create_llm_cache() -> Optional[LLMResponseCache]:
+    """Build the LLM response cache selected in settings, or None if it's disabled."""
+    if settings.llm_cache_backend == "none":
+        return None
+    if settings.llm_cache_backend == "sqlite":
+        backend = SQLiteBackend(settings.llm_cache_path, settings.llm_cache_max_bytes)
+    elif settings.llm_cache_backend == "redis":
+        backend = RedisBackend(settings.llm_cache_redis_url, settings.llm_cache_redis_timeout)
+    else:
+        backend = MemoryBackend(settings.llm_cache_max_bytes)
+    return LLMResponseCache(backend, settings.llm_cache_ttl)
+
+
+llm_cache = create_llm_cache()
@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Optional
+
+from fastapi import HTTPException
+from google.api_core import exceptions as google_exceptions
+from tenacity import (
+    AsyncRetrying,
+    retry_if_exception,
+    stop_after_attempt,
+    stop_before_delay,
+    wait_exponential_jitter,
+)
+
+from settings import settings
+from streaming import message_text
+
+logger = logging.getLogger(__name__)
+
+# Quota and rate-limit errors: back off, and shrink the concurrency limit
+_OVERLOAD_ERRORS = (google_exceptions.TooManyRequests,)
+# Transient server-side errors worth another attempt
+_TRANSIENT_ERRORS = _OVERLOAD_ERRORS + (
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    asyncio.TimeoutError,
+)
+# langchain sometimes wraps the API error in its own exception; fall back to the message
+_OVERLOAD_MARKERS = ("429", "resource_exhausted", "resource exhausted", "quota", "rate limit")
+_TRANSIENT_MARKERS = _OVERLOAD_MARKERS + ("503", "unavailable", "500 internal", "deadline")
+
+
+def is_overload(error: BaseException) -> bool:
+    if isinstance(error, _OVERLOAD_ERRORS):
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in _OVERLOAD_MARKERS)
+
+
+def is_transient(error: BaseException) -> bool:
+    if isinstance(error, HTTPException):
+        return False
+    if isinstance(error, _TRANSIENT_ERRORS):
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in _TRANSIENT_MARKERS)
+
+
+class LLMOverloaded(HTTPException):
+    """The model can't take the call before its deadline, or kept refusing it for quota."""
+
+    def __init__(self, retry_after: float = 30.0):
+        super().__init__(
+            status_code=503,
+            detail="LLM capacity exhausted, try again later",
+            headers={"Retry-After": str(int(retry_after) + 1)},
+        )
+
+
+class AIMDLimiter:
+    """Concurrency limit for LLM calls that adapts with additive increase, multiplicative decrease.
+
+    Each call that finishes within `target_latency` raises the limit by 1/limit
+    (about +1 per limit's worth of calls); a quota error or a slow call halves
+    it, at most once per observed call latency so one burst of failures counts
+    once. Callers over the limit wait in FIFO order.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, target_latency: float):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.in_flight = 0
+        # Smoothed latency of successful calls, in seconds
+        self.latency: Optional[float] = None
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+
+    def estimated_wait(self) -> float:
+        """Rough time a new caller would spend queued before getting a slot."""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            return 0.0
+        rounds = (len(self._waiters) + 1) / max(int(self.limit), 1)
+        return rounds * (self.latency or self.target_latency)
+
+    async def acquire(self, timeout: float) -> None:
+        """Take a slot, waiting at most `timeout` seconds. Raises asyncio.TimeoutError."""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except BaseException:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif waiter.done() and not waiter.cancelled():
+                self.release()  # the slot was handed over just as we gave up
+            raise
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def on_success(self, latency: float) -> None:
+        self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        if latency > self.target_latency:
+            self._decrease()
+        else:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._wake()
+
+    def on_overload(self) -> None:
+        self._decrease()
+
+    def _decrease(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < (self.latency or 1.0):
+            return
+        self._last_decrease = now
+        lowered = max(self.minimum, self.limit / 2)
+        if int(lowered) < int(self.limit):
+            logger.warning(f"LLM concurrency limit lowered to {int(lowered)}")
+        self.limit = lowered
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+
+class LLMGateway:
+    """Single way out to the model: adaptive concurrency, retries and deadline-aware admission.
+
+    Every call has a deadline. A call is turned away with LLMOverloaded
+    straight away when the queue ahead of it won't clear in time, instead of
+    spending quota on an answer that would arrive too late. Transient and
+    quota errors are retried with exponential backoff and jitter while the
+    deadline allows, releasing the slot between attempts.
+    """
+
+    def __init__(
+        self,
+        limiter: AIMDLimiter,
+        max_attempts: int = settings.llm_max_attempts,
+        deadline: float = settings.llm_deadline,
+    ):
+        self.limiter = limiter
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+
+    def _retrying(self, deadline: float) -> AsyncRetrying:
+        return AsyncRetrying(
+            retry=retry_if_exception(is_transient),
+            wait=wait_exponential_jitter(initial=1, max=20),
+            stop=stop_after_attempt(self.max_attempts) | stop_before_delay(deadline - time.monotonic()),
+            reraise=True,
+        )
+
+    async def _admit(self, deadline: float) -> float:
+        """Wait for a slot within the deadline; returns when the call started."""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or self.limiter.estimated_wait() > remaining:
+            raise LLMOverloaded(self.limiter.estimated_wait())
+        try:
+            await self.limiter.acquire(remaining)
+        except asyncio.TimeoutError:
+            raise LLMOverloaded(self.limiter.estimated_wait())
+        return time.monotonic()
+
+    def _failed(self, error: BaseException) -> None:
+        self.limiter.release()
+        if is_overload(error):
+            self.limiter.on_overload()
+
+    def _succeeded(self, started: float) -> None:
+        self.limiter.release()
+        self.limiter.on_success(time.monotonic() - started)
+
+    async def invoke(
+        self, llm, prompt: list, on_first_token: Optional[Callable[[], None]] = None,
+        deadline: Optional[float] = None,
+    ) -> str:
+        """Run the prompt and return the output text, streaming it if the first token is watched."""
+        deadline = deadline or time.monotonic() + self.deadline
+        first_token_seen = False
+        try:
+            async for attempt in self._retrying(deadline):
+                with attempt:
+                    started = await self._admit(deadline)
+                    try:
+                        if on_first_token is None:
+                            text = message_text(await llm.ainvoke(prompt))
+                        else:
+                            parts = []
+                            async for chunk in llm.astream(prompt):
+                                # Once per call, not once per retried attempt
+                                if not first_token_seen:
+                                    first_token_seen = True
+                                    on_first_token()
+                                parts.append(message_text(chunk))
+                            text = "".join(parts)
+                    except BaseException as e:
+                        self._failed(e)
+                        raise
+                    self._succeeded(started)
+        except Exception as e:
+            if is_overload(e) and not isinstance(e, HTTPException):
+                raise LLMOverloaded() from e
+            raise
+        return text
+
+    async def stream(self, llm, prompt: list, deadline: Optional[float] = None) -> AsyncIterator[Any]:
+        """Stream the model's chunks. Failures are retried only until the first chunk arrives.
+
+        The call holds a concurrency slot until the stream is exhausted or closed;
+        callers that may stop early should iterate it under contextlib.aclosing.
+        """
+        deadline = deadline or time.monotonic() + self.deadline
+        try:
+            async for attempt in self._retrying(deadline):
+                with attempt:
+                    started = await self._admit(deadline)
+                    try:
+                        chunks = llm.astream(prompt).__aiter__()
+                        first = await chunks.__anext__()
+                    except StopAsyncIteration:
+                        self._succeeded(started)
+                        return
+                    except BaseException as e:
+                        self._failed(e)
+                        raise
+        except Exception as e:
+            if is_overload(e) and not isinstance(e, HTTPException):
+                raise LLMOverloaded() from e
+            raise
+
+        try:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        except BaseException as e:
+            self._failed(e)
+            raise
+        self._succeeded(started)
+
+
+llm_gateway = LLMGateway(AIMDLimiter(
+    initial=settings.llm_initial_concurrency,
+    minimum=settings.llm_min_concurrency,
+    maximum=settings.llm_max_concurrency,
+    target_latency=settings.llm_target_latency,
+))
@@ -0,0 +1,231 @@
+import logging
+import posixpath
+import re
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Set, Tuple
+
+import ijson
+import yaml
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+logger = logging.getLogger(__name__)
+
+# Loader for pnpm and yarn berry lockfiles; the C loader is several times faster
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# A reduced lockfile is a sequence of (name, version, dev) rows
+Row = Tuple[str, str, bool]
+
+_YARN_VERSION = re.compile(r'^\s+version:?\s+"?([^"\s]+)"?')
+_PNPM_PACKAGES = re.compile(r"^packages:", re.MULTILINE)
+
+# Characters handed to ijson per read
+READ_CHUNK_CHARS = 64 * 1024
+
+
+class _TextReader:
+    """Binary file-like view over a string, encoding it one chunk at a time for ijson."""
+
+    def __init__(self, text: str):
+        self._text = text
+        self._pos = 0
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = len(self._text)
+        size = min(size, READ_CHUNK_CHARS)
+        chunk = self._text[self._pos:self._pos + size]
+        self._pos += len(chunk)
+        return chunk.encode("utf-8")
+
+
+def iter_lines(text: str) -> Iterator[str]:
+    """Yield the lines of `text` lazily, without building a list of them."""
+    start = 0
+    while start < len(text):
+        end = text.find("\n", start)
+        if end == -1:
+            end = len(text)
+        yield text[start:end].rstrip("\r")
+        start = end + 1
+
+
+def _spec_name(spec: str) -> str:
+    """Package name from a lockfile spec like "react@^18", "@babel/core@npm:7.0.0"."""
+    spec = spec.strip().strip('"')
+    at = spec.find("@", 1)
+    return spec[:at] if at > 0 else spec
+
+
+def _reduce_package_lock(content: str, max_lines: int) -> Iterator[Row]:
+    # lockfileVersion 2/3 start with a root entry listing the direct
+    # dependencies; their installed versions follow under node_modules/<name>
+    packages = ijson.kvitems(_TextReader(content), "packages")
+    root = next((entry for path, entry in packages if path == ""), None)
+    if root is None:
+        # lockfileVersion 1 has no root entry; keep the hoisted packages
+        for name, entry in ijson.kvitems(_TextReader(content), "dependencies"):
+            yield name, entry.get("version", ""), bool(entry.get("dev"))
+        return
+
+    direct: Dict[str, Tuple[str, bool]] = {}
+    for section, dev in (
+        ("dependencies", False), ("optionalDependencies", False), ("devDependencies", True)
+    ):
+        for name, wanted in root.get(section, {}).items():
+            direct.setdefault(name, (wanted, dev))
+    # One extra so the caller can tell the table was cut short
+    wanted_names = set(islice(direct, max_lines + 1))
+
+    versions: Dict[str, str] = {}
+    for path, entry in packages:
+        name = path[len("node_modules/"):]
+        if path.startswith("node_modules/") and name in wanted_names:
+            versions[name] = entry.get("version", "")
+            if len(versions) == len(wanted_names):
+                break  # every direct dependency is resolved; skip the rest of the file
+
+    for name, (wanted, dev) in direct.items():
+        yield name, versions.get(name) or wanted, dev
+
+
+def _reduce_yarn_v1(content: str) -> Iterator[Row]:
+    name = None
+    for line in iter_lines(content):
+        if not line or line.startswith("#"):
+            continue
+        if not line[0].isspace():
+            # Entry header, e.g. `"@babel/core@^7.0.0", "@babel/core@^7.12.3":`
+            name = _spec_name(line.rstrip(":").split(",")[0])
+            continue
+        match = _YARN_VERSION.match(line)
+        if name and match:
+            yield name, match.group(1), False
+            name = None
+
+
+def _reduce_yarn_berry(content: str) -> List[Row]:
+    data = yaml.load(content, Loader=_YAML_LOADER)
+    rows: List[Row] = []
+    for key, entry in data.items():
+        if key == "__metadata" or not isinstance(entry, dict):
+            continue
+        version = str(entry.get("version", ""))
+        if version == "0.0.0-use.local":
+            continue  # the workspace packages themselves
+        rows.append((_spec_name(key.split(",")[0]), version, False))
+    return rows
+
+
+def _reduce_yarn(content: str, max_lines: int) -> Iterable[Row]:
+    if "__metadata:" in content[:READ_CHUNK_CHARS]:
+        return _reduce_yarn_berry(content)
+    return _reduce_yarn_v1(content)
+
+
+def _pnpm_version(value) -> str:
+    # v6+ entries are {specifier, version}; versions carry peer suffixes,
+    # "18.2.0(react@18.2.0)" in v6+ and "18.2.0_react@18.2.0" in v5
+    if isinstance(value, dict):
+        value = value.get("version", "")
+    return re.split(r"[(_]", str(value), maxsplit=1)[0]
+
+
+def _reduce_pnpm(content: str, max_lines: int) -> List[Row]:
+    # Direct dependencies all come before the top-level `packages:` map, which
+    # holds the resolved graph and is most of the file; don't parse it
+    packages = _PNPM_PACKAGES.search(content)
+    if packages is not None:
+        content = content[:packages.start()]
+    data = yaml.load(content, Loader=_YAML_LOADER) or {}
+    # Workspaces list each project under `importers`; single projects keep
+    # their dependencies at the top level (before v9)
+    importers = data.get("importers") or {".": data}
+    rows: List[Row] = []
+    for importer, deps in importers.items():
+        prefix = "" if importer == "." else f"{importer}: "
+        for section, dev in (
+            ("dependencies", False), ("optionalDependencies", False), ("devDependencies", True)
+        ):
+            for name, value in (deps.get(section) or {}).items():
+                rows.append((prefix + name, _pnpm_version(value), dev))
+    return rows
+
+
+def _reduce_poetry(content: str, max_lines: int) -> List[Row]:
+    if tomllib is None:
+        raise ValueError("TOML parser unavailable")
+    data = tomllib.loads(content)
+    return [
+        (package["name"], package.get("version", ""), package.get("category") == "dev")
+        for package in data.get("package", [])
+    ]
+
+
+def _reduce_pipfile_lock(content: str, max_lines: int) -> Iterator[Row]:
+    for section, dev in (("default", False), ("develop", True)):
+        for name, entry in ijson.kvitems(_TextReader(content), section):
+            yield name, entry.get("version", "").lstrip("="), dev
+
+
+# Lockfile name -> (reducer, separator between name and version)
+REDUCERS: Dict[str, Tuple[Callable[[str, int], Iterable[Row]], str]] = {
+    "package-lock.json": (_reduce_package_lock, "@"),
+    "yarn.lock": (_reduce_yarn, "@"),
+    "pnpm-lock.yaml": (_reduce_pnpm, "@"),
+    "poetry.lock": (_reduce_poetry, "=="),
+    "pipfile.lock": (_reduce_pipfile_lock, "=="),
+}
+
+
+def _format_rows(rows: Iterable[Row], separator: str, max_lines: int) -> str:
+    """Render up to `max_lines` distinct rows, stopping the reducer as soon as that many are found."""
+    seen: Set[Row] = set()
+    lines: List[str] = []
+    for row in rows:
+        if row in seen:
+            continue
+        if len(lines) == max_lines:
+            lines.append("... more packages")
+            break
+        seen.add(row)
+        name, version, dev = row
+        lines.append(f"{name}{separator}{version}" + (" (dev)" if dev else "") if version else name)
+    return "\n".join(lines)
+
+
+def filter_lockfile_lines(content: str, max_lines: int) -> str:
+    """Keep the lines of a lockfile that mention versions or sources (any format)."""
+    important_lines = list(islice(
+        (
+            line for line in iter_lines(content)
+            if "version" in line.lower() or "@" in line or "resolved" in line.lower()
+        ),
+        max_lines,
+    ))
+    return "\n".join(important_lines or islice(iter_lines(content), max_lines))
+
+
+def reduce_lockfile(path: str, content: str, max_lines: int) -> str:
+    """Reduce a lockfile to a compact dependency -> version table for the prompt.
+
+    Known formats are parsed and reduced to one `name@version` (or `name==version`)
+    row per package, direct dependencies only where the format records them.
+    Line- and JSON-based formats are read incrementally and stop once `max_lines`
+    rows are found. Other lockfiles, and ones that fail to parse, fall back to a
+    line filter.
+    """
+    reducer = REDUCERS.get(posixpath.basename(path).lower())
+    if reducer is not None:
+        reduce, separator = reducer
+        try:
+            table = _format_rows(reduce(content, max_lines), separator, max_lines)
+            if table:
+                return table
+        except Exception as e:
+            logger.warning(f"Could not parse lockfile {path}, filtering lines instead: {str(e)}")
+    return filter_lockfile_lines(content, max_lines)
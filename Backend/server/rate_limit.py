@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import httpx
+from fastapi import HTTPException
+
+from content_cache import token_scope
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Budgets are tracked for at most this many (token, resource) pairs
+MAX_TRACKED_BUDGETS = 10000
+
+
+class RateLimitExceeded(HTTPException):
+    """GitHub's budget for a token won't recover soon enough to finish the request."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(
+            status_code=429,
+            detail="GitHub rate limit exceeded, try again later",
+            headers={"Retry-After": str(int(retry_after) + 1)},
+        )
+
+
+@dataclass
+class _Budget:
+    remaining: Optional[int] = None
+    reset_at: float = 0.0
+    blocked_until: float = 0.0
+    # Earliest time the next paced request may go out
+    next_slot: float = 0.0
+
+
+def resource_for(url: str) -> str:
+    """The GitHub rate-limit resource a request to `url` is counted against."""
+    return "graphql" if url.rstrip("/").endswith("/graphql") else "core"
+
+
+class RateLimiter:
+    """Per-token GitHub request budgets, learned from rate-limit response headers.
+
+    Every response updates the token's remaining budget and reset time for its
+    resource (REST "core" or "graphql"). Requests go out freely while budget is
+    plentiful; once it drops to `reserve`, they are spaced evenly over what's
+    left of the window, each caller taking the next free slot. A 403/429
+    rate-limit response blocks the token until Retry-After, the window reset,
+    or an exponential backoff with jitter has passed. Waits longer than
+    `max_wait` raise RateLimitExceeded instead.
+    """
+
+    def __init__(
+        self,
+        reserve: int = settings.github_rate_limit_reserve,
+        max_wait: float = settings.github_rate_limit_max_wait,
+        max_retries: int = settings.github_max_retries,
+        backoff_base: float = settings.github_backoff_base,
+    ):
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self._budgets: "OrderedDict[Tuple[str, str], _Budget]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _budget(self, token: str, resource: str) -> _Budget:
+        key = (token_scope(token), resource)
+        with self._lock:
+            budget = self._budgets.get(key)
+            if budget is None:
+                budget = self._budgets[key] = _Budget()
+                if len(self._budgets) > MAX_TRACKED_BUDGETS:
+                    self._budgets.popitem(last=False)
+            else:
+                self._budgets.move_to_end(key)
+            return budget
+
+    def available(self, token: str, resource: str = "core") -> Optional[int]:
+        """Requests `acquire` will let the token make without giving up, or None if unknown.
+
+        That is everything above the reserve, plus the paced requests whose
+        slots come up within `max_wait`.
+        """
+        budget = self._budget(token, resource)
+        now = time.time()
+        if budget.remaining is None or budget.reset_at <= now:
+            return None
+        if budget.remaining <= 0 or budget.blocked_until > now + self.max_wait:
+            return 0
+
+        free = max(budget.remaining - self.reserve, 0)
+        paced = min(budget.remaining, self.reserve)
+        if not paced:
+            return free
+        first = max(budget.next_slot - now, budget.blocked_until - now, 0.0)
+        if first > self.max_wait:
+            return free
+        interval = (budget.reset_at - now) / paced
+        return free + min(paced, int((self.max_wait - first) / interval) + 1)
+
+    async def acquire(self, token: str, resource: str = "core") -> None:
+        """Wait until the token may send another request. Raises RateLimitExceeded."""
+        budget = self._budget(token, resource)
+        now = time.time()
+        wait = interval = 0.0
+        if budget.blocked_until > now:
+            wait = budget.blocked_until - now
+        elif budget.remaining is not None and budget.reset_at > now:
+            if budget.remaining <= 0:
+                wait = budget.reset_at - now
+            elif budget.remaining <= self.reserve:
+                # Nearly out: spread what's left evenly over the rest of the window,
+                # each concurrent caller taking the slot after the one before it
+                wait = max(budget.next_slot - now, 0.0)
+                interval = (budget.reset_at - now) / budget.remaining
+
+        if wait > self.max_wait:
+            raise RateLimitExceeded(wait)
+        if interval:
+            budget.next_slot = now + wait + interval
+        if budget.remaining is not None:
+            # Count the request now, so concurrent callers see it before its response
+            budget.remaining -= 1
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def record(self, token: str, resp: httpx.Response, attempt: int) -> Optional[float]:
+        """Learn from a response's headers. Returns how long to wait before retrying
+        it if it was rate limited, or None if it should be used as is.
+        """
+        budget = self._budget(token, resp.headers.get("X-RateLimit-Resource", "core"))
+        now = time.time()
+        remaining = resp.headers.get("X-RateLimit-Remaining")
+        reset = resp.headers.get("X-RateLimit-Reset")
+        try:
+            if remaining is not None:
+                budget.remaining = int(remaining)
+            if reset is not None:
+                budget.reset_at = float(reset)
+        except ValueError:
+            pass
+
+        if not _is_rate_limited(resp):
+            return None
+
+        retry_after = resp.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            delay = float(retry_after)
+        elif budget.remaining == 0 and budget.reset_at > now:
+            delay = budget.reset_at - now
+        else:
+            # Secondary limits don't always say how long to wait
+            delay = self.backoff_base * 2 ** attempt
+        delay += random.uniform(0, self.backoff_base)
+        budget.blocked_until = max(budget.blocked_until, now + delay)
+
+        if attempt >= self.max_retries or delay > self.max_wait:
+            logger.warning(f"GitHub rate limit hit, giving up after {attempt + 1} attempts")
+            raise RateLimitExceeded(delay)
+        logger.warning(f"GitHub rate limit hit ({resp.status_code}), retrying in {delay:.1f}s")
+        return delay
+
+
+def _is_rate_limited(resp: httpx.Response) -> bool:
+    if resp.status_code == 429:
+        return True
+    if resp.status_code != 403:
+        return False
+    if resp.headers.get("X-RateLimit-Remaining") == "0" or "Retry-After" in resp.headers:
+        return True
+    try:
+        return "rate limit" in resp.text.lower()
+    except httpx.ResponseNotRead:
+        return False
+
+
+rate_limiter = RateLimiter()
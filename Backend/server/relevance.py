@@ -0,0 +1,70 @@
+from typing import Dict, Iterable, Mapping, Optional
+
+RELEVANT_FILES = {
+    "common": {
+        "dockerfile", ".docker/dockerfile", "docker-compose.yml",
+        "jenkinsfile", ".gitlab-ci.yml", "azure-pipelines.yml",
+        ".circleci/config.yml", "readme.md"
+    },
+    "node": {"package.json", "yarn.lock", "pnpm-lock.yaml", "package-lock.json"},
+    "python": {"requirements.txt", "pipfile", "pipfile.lock", "pyproject.toml", "poetry.lock"},
+    "java": {"pom.xml", "build.gradle", "settings.gradle", "gradlew", "gradlew.bat"}
+}
+
+# Lockfiles, which get reduced before they go into the prompt
+LARGE_FILE_SUFFIXES = (
+    ".lock", "package-lock.json", "yarn.lock",
+    "pnpm-lock.yaml", "poetry.lock"
+)
+
+# Directories that only ever hold vendored or generated code; skipped when the
+# tree has to be walked directory by directory
+PRUNED_DIRS = frozenset({
+    "node_modules", "bower_components", "vendor", "third_party",
+    ".venv", "venv", "site-packages", "__pycache__", ".tox", ".git",
+})
+
+WORKFLOW_BUCKET = "workflows"
+WORKFLOW_PREFIX = ".github/workflows/"
+WORKFLOW_SUFFIXES = (".yml", ".yaml")
+
+
+class RelevanceMatcher:
+    """Classifies repository paths into ecosystem buckets in O(1) per path.
+
+    A pattern matches a path when it equals the whole (lower-cased) path or its
+    trailing segments, e.g. "package.json" matches "apps/web/package.json" and
+    ".circleci/config.yml" matches "ci/.circleci/config.yml". Patterns are indexed
+    by segment count, so each path costs one dict lookup per distinct count
+    instead of a scan over every pattern.
+    """
+
+    def __init__(self, relevant_files: Mapping[str, Iterable[str]]):
+        self._patterns: Dict[str, str] = {}
+        for bucket, names in relevant_files.items():
+            for name in names:
+                self._patterns.setdefault(name.lower(), bucket)
+        self._segment_counts = sorted({name.count("/") + 1 for name in self._patterns})
+
+    def match(self, path: str) -> Optional[str]:
+        """Return the bucket `path` belongs to, or None if it isn't relevant."""
+        lower_path = path.lower()
+        if lower_path.startswith(WORKFLOW_PREFIX) and lower_path.endswith(WORKFLOW_SUFFIXES):
+            return WORKFLOW_BUCKET
+
+        segments = lower_path.rsplit("/", self._segment_counts[-1])
+        for count in self._segment_counts:
+            if count > len(segments):
+                break
+            bucket = self._patterns.get("/".join(segments[-count:]))
+            if bucket:
+                return bucket
+        return None
+
+
+def is_pruned_dir(name: str) -> bool:
+    """Whether a directory (by its own name) can be skipped during a tree walk."""
+    return name.lower() in PRUNED_DIRS
+
+
+relevance_matcher = RelevanceMatcher(RELEVANT_FILES)
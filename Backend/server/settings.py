@@ -0,0 +1,83 @@
+from typing import Literal, Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    """Runtime configuration, overridable through environment variables or a .env file."""
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+    # LLM
+    google_api_key: Optional[str] = None
+    llm_model: str = "gemini-2.5-pro"
+    llm_temperature: float = 0.1
+    # Cheaper model tried first for small inputs (at most this many files and
+    # prompt tokens); output that fails validation is redone with llm_model.
+    # Leave empty to always use llm_model.
+    llm_fast_model: Optional[str] = "gemini-2.5-flash"
+    llm_cascade_max_files: int = 20
+    llm_cascade_max_tokens: int = 8000
+    # Local tokenizer used to estimate prompt sizes
+    token_encoding: str = "cl100k_base"
+    # Token budget for the repository snapshot in the /analyze prompt
+    snapshot_token_budget: int = 30000
+    # LLM gateway: adaptive concurrency bounds, calls slower than the target
+    # latency shrink the limit, retries per call and the deadline for each call
+    llm_initial_concurrency: int = 4
+    llm_min_concurrency: int = 1
+    llm_max_concurrency: int = 32
+    llm_target_latency: float = 45.0
+    llm_max_attempts: int = 4
+    llm_deadline: float = 120.0
+
+    # Server-Sent Events: send a keep-alive comment after this many idle seconds
+    sse_heartbeat_interval: float = 15.0
+
+    # GitHub
+    github_api_base: str = "https://api.github.com"
+    github_timeout: float = 10.0
+    github_max_connections: int = 100
+    github_max_keepalive_connections: int = 20
+    github_fetch_concurrency: int = 8
+    github_fetch_mode: Literal["contents", "blobs", "graphql"] = "graphql"
+    github_graphql_batch_size: int = 50
+    # Stream the repo tarball once this many files need fetching (0 disables)
+    github_archive_threshold: int = 150
+    # Rate limits: pace requests once a token has this few left, retry rate-limited
+    # responses with exponential backoff, and fail with 429 rather than wait longer
+    github_rate_limit_reserve: int = 50
+    github_rate_limit_max_wait: float = 30.0
+    github_max_retries: int = 3
+    github_backoff_base: float = 1.0
+
+    # Blob content cache
+    blob_cache_max_bytes: int = 64 * 1024 * 1024
+    blob_cache_dir: Optional[str] = None
+
+    # Conditional request (ETag) cache
+    etag_cache_max_bytes: int = 32 * 1024 * 1024
+
+    # Commit-keyed /analyze result cache
+    analysis_cache_max_bytes: int = 8 * 1024 * 1024
+
+    # Background /analyze jobs: SQLite job store, worker count, queue bound, result retention
+    analysis_job_db: str = "analysis_jobs.sqlite3"
+    analysis_job_workers: int = 4
+    analysis_job_max_pending: int = 1000
+    analysis_job_ttl: float = 24 * 3600
+
+    # /generate-pipeline result cache
+    pipeline_cache_max_bytes: int = 8 * 1024 * 1024
+
+    # LLM response cache, keyed by a hash of the normalized snapshot
+    llm_cache_backend: Literal["memory", "sqlite", "redis", "none"] = "memory"
+    llm_cache_ttl: float = 7 * 24 * 3600
+    llm_cache_max_bytes: int = 16 * 1024 * 1024
+    llm_cache_path: str = "llm_cache.sqlite3"
+    llm_cache_redis_url: str = "redis://localhost:6379/0"
+    # Seconds to wait on Redis before treating the lookup as a miss
+    llm_cache_redis_timeout: float = 2.0
+
+
+settings = Settings()
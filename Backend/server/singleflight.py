@@ -0,0 +1,67 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Called as progress(event, data) for each stage of a computation
+ProgressCallback = Callable[[str, dict], None]
+
+
+class _Flight:
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.listeners: List[ProgressCallback] = []
+        self.waiters = 0
+
+    def emit(self, event: str, data: dict) -> None:
+        for listener in list(self.listeners):
+            listener(event, data)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one computation.
+
+    The first caller for a key starts `compute(emit)` as a task; callers that
+    arrive while it runs wait on the same task and get the same result (or
+    exception). Progress events are fanned out to every waiting caller. The
+    computation is cancelled only once every caller has gone away.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+
+    async def do(
+        self,
+        key: str,
+        compute: Callable[[ProgressCallback], Awaitable[Any]],
+        progress: Optional[ProgressCallback] = None,
+    ) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            flight.task = asyncio.create_task(compute(flight.emit))
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self._flights[key] = flight
+        else:
+            logger.info(f"Joining in-flight computation for {key}")
+            if progress:
+                progress("coalesced", {})
+
+        if progress:
+            flight.listeners.append(progress)
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if progress:
+                flight.listeners.remove(progress)
+            if flight.waiters == 0 and not flight.task.done():
+                # Nobody is waiting for the result any more
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
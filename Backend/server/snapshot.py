@@ -0,0 +1,82 @@
+import logging
+import posixpath
+from typing import List, Mapping, Tuple
+
+from relevance import LARGE_FILE_SUFFIXES, WORKFLOW_BUCKET
+from tokens import count_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+EMPTY_SNAPSHOT = "No relevant files found in repository"
+FILE_SEPARATOR = "\n\n"
+TRUNCATION_MARKER = "\n... (truncated to fit the prompt budget)"
+
+# Lower rank = packed first: manifests, CI config, lockfiles, Docker, README
+RANK_MANIFEST = 0
+RANK_CI = 1
+RANK_LOCKFILE = 2
+RANK_DOCKER = 3
+RANK_README = 4
+
+CI_FILES = {"jenkinsfile", ".gitlab-ci.yml", "azure-pipelines.yml", "config.yml"}
+DOCKER_FILES = {"dockerfile", "docker-compose.yml"}
+
+# Don't bother including a truncated file unless at least this much of it fits
+MIN_PARTIAL_TOKENS = 200
+
+
+def file_rank(path: str, bucket: str) -> Tuple[int, int, str]:
+    """Sort key ranking how useful a file is for CI analysis; shallow paths win ties."""
+    lower_path = path.lower()
+    name = posixpath.basename(lower_path)
+    if name == "readme.md":
+        rank = RANK_README
+    elif name in DOCKER_FILES:
+        rank = RANK_DOCKER
+    elif bucket == WORKFLOW_BUCKET or name in CI_FILES:
+        rank = RANK_CI
+    elif lower_path.endswith(LARGE_FILE_SUFFIXES):
+        rank = RANK_LOCKFILE
+    else:
+        rank = RANK_MANIFEST
+    return rank, path.count("/"), path
+
+
+def build_snapshot(
+    files: Mapping[str, str], buckets: Mapping[str, str], token_budget: int
+) -> str:
+    """Pack the most useful files into a prompt snapshot of at most `token_budget` tokens.
+
+    Files are taken in `file_rank` order. One that doesn't fit whole is truncated
+    if a meaningful part of it fits, otherwise skipped; skipped paths are listed
+    at the end so the model still knows they exist.
+    """
+    if not files:
+        return EMPTY_SNAPSHOT
+
+    sections: List[str] = []
+    omitted: List[str] = []
+    remaining = token_budget
+    separator_cost = count_tokens(FILE_SEPARATOR)
+
+    for path in sorted(files, key=lambda p: file_rank(p, buckets.get(p, ""))):
+        section = f"File: {path}\n{files[path]}"
+        cost = count_tokens(section) + separator_cost
+        if cost <= remaining:
+            sections.append(section)
+            remaining -= cost
+            continue
+
+        available = remaining - separator_cost - count_tokens(TRUNCATION_MARKER)
+        if available >= MIN_PARTIAL_TOKENS:
+            partial = truncate_to_tokens(section, available) + TRUNCATION_MARKER
+            sections.append(partial)
+            remaining -= count_tokens(partial) + separator_cost
+        else:
+            omitted.append(path)
+
+    if omitted:
+        logger.info(f"Snapshot budget of {token_budget} tokens left out {len(omitted)} files")
+        sections.append("Files omitted to fit the prompt budget:\n" + "\n".join(omitted))
+
+    return FILE_SEPARATOR.join(sections)
@@ -0,0 +1,106 @@
+import json
+import re
+from typing import Any, List
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # Stop reverse proxies (nginx) from buffering the stream
+    "X-Accel-Buffering": "no",
+}
+
+_JSON_ESCAPES = {
+    '"': '"', "\\": "\\", "/": "/",
+    "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t",
+}
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def message_text(chunk: Any) -> str:
+    """Plain text of an LLM message chunk, whether its content is a string or a list of parts."""
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    parts: List[str] = []
+    for part in content:
+        if isinstance(part, str):
+            parts.append(part)
+        elif isinstance(part, dict) and part.get("type") == "text":
+            parts.append(part.get("text", ""))
+    return "".join(parts)
+
+
+class JSONStringFieldStreamer:
+    """Incrementally decodes one string field out of a JSON document as it streams in.
+
+    `feed` takes the next raw chunk of model output and returns whatever new,
+    fully-decoded characters of the field's value it completed. Escape sequences
+    split across chunks are held back until they can be decoded. The raw text
+    seen so far is kept in `text` for the final parse.
+    """
+
+    def __init__(self, field: str):
+        self._start = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._pos = None
+        self.text = ""
+        self.done = False
+
+    def feed(self, chunk: str) -> str:
+        self.text += chunk
+        if self.done:
+            return ""
+        if self._pos is None:
+            match = self._start.search(self.text)
+            if not match:
+                return ""
+            self._pos = match.end()
+
+        text, i, out = self.text, self._pos, []
+        while i < len(text):
+            char = text[i]
+            if char == '"':
+                self.done = True
+                i += 1
+                break
+            if char != "\\":
+                out.append(char)
+                i += 1
+                continue
+
+            if i + 1 >= len(text):
+                break
+            escape = text[i + 1]
+            if escape != "u":
+                out.append(_JSON_ESCAPES.get(escape, escape))
+                i += 2
+                continue
+
+            if i + 6 > len(text):
+                break
+            try:
+                code = int(text[i + 2:i + 6], 16)
+            except ValueError:
+                out.append(text[i:i + 6])
+                i += 6
+                continue
+            if 0xD800 <= code < 0xDC00:
+                # High surrogate: wait for its low half
+                if i + 12 > len(text):
+                    break
+                if text[i + 6:i + 8] == "\\u":
+                    try:
+                        low = int(text[i + 8:i + 12], 16)
+                    except ValueError:
+                        low = 0
+                    if 0xDC00 <= low < 0xE000:
+                        out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                        i += 12
+                        continue
+            out.append(chr(code))
+            i += 6
+
+        self._pos = i
+        return "".join(out)
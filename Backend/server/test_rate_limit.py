@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from rate_limit import RateLimitExceeded, RateLimiter
+
+
+def limiter_with(remaining: int, reset_in: float, reserve: int = 50, max_wait: float = 30.0) -> RateLimiter:
+    limiter = RateLimiter(reserve=reserve, max_wait=max_wait)
+    resp = httpx.Response(200, headers={
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(time.time() + reset_in),
+    })
+    limiter.record("token", resp, 0)
+    return limiter
+
+
+def test_available_counts_only_requests_acquire_lets_through():
+    # 10 above the reserve, then slots 60s apart: only the first fits in max_wait
+    limiter = limiter_with(remaining=60, reset_in=3000)
+    assert limiter.available("token") == 11
+
+    async def spend(count: int) -> None:
+        for _ in range(count):
+            await limiter.acquire("token")
+
+    asyncio.run(spend(11))
+    assert limiter.available("token") == 0
+    with pytest.raises(RateLimitExceeded):
+        asyncio.run(spend(1))
+
+
+def test_available_includes_paced_requests_within_max_wait():
+    # At the reserve with 1s slots, the next 31 requests start within 30s
+    limiter = limiter_with(remaining=40, reset_in=40)
+    assert limiter.available("token") == 31
+
+
+def test_available_unknown_without_rate_limit_headers():
+    assert RateLimiter().available("token") is None
+
+
+def test_paced_requests_are_spaced_out():
+    limiter = limiter_with(remaining=40, reset_in=4)
+    fired = []
+
+    async def main() -> None:
+        start = time.monotonic()
+
+        async def one() -> None:
+            await limiter.acquire("token")
+            fired.append(time.monotonic() - start)
+
+        await asyncio.gather(*(one() for _ in range(5)))
+
+    asyncio.run(main())
+    gaps = [later - earlier for earlier, later in zip(fired, fired[1:])]
+    assert all(gap >= 0.08 for gap in gaps)
@@ -0,0 +1,47 @@
+import logging
+from functools import lru_cache
+from typing import Optional
+
+import tiktoken
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Rough characters-per-token ratio, used when the tokenizer can't be loaded
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=1)
+def _encoding() -> Optional["tiktoken.Encoding"]:
+    try:
+        return tiktoken.get_encoding(settings.token_encoding)
+    except Exception as e:
+        # tiktoken downloads its BPE files on first use, which fails offline
+        logger.warning(f"Tokenizer {settings.token_encoding} unavailable, estimating tokens: {str(e)}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Estimate how many tokens `text` costs in a prompt.
+
+    Gemini's own tokenizer is only reachable through an API call, so this uses a
+    local BPE encoding as a close, free approximation.
+    """
+    encoding = _encoding()
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut `text` down to at most `max_tokens` tokens, keeping its beginning."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _encoding()
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])